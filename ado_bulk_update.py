@@ -16,13 +16,22 @@ Description:
 from azure.identity import DefaultAzureCredential
 
 from msrest.authentication import BasicTokenAuthentication
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from azure.devops.connection import Connection
 from azure.devops.exceptions import AzureDevOpsServiceError
 from azure.devops.v7_0.search.models import CodeSearchRequest
+import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+from itertools import groupby
 import json
+import logging
+import re
 import sys
-import textwrap
+import threading
+import time
+from urllib.parse import quote
 import yaml
 
 from azure.devops.v7_0.git.models import (
@@ -36,6 +45,12 @@ from azure.devops.v7_0.git.models import (
     GitPullRequestSearchCriteria,
 )
 
+logging.basicConfig(
+    level=logging.INFO, format="%(asctime)s %(threadName)s %(message)s")
+logger = logging.getLogger("ado_bulk_update")
+# Keep the credential chain of azure-identity from flooding the output.
+logging.getLogger("azure").setLevel(logging.WARNING)
+
 with open("settings.yaml", "r") as file:
     settings = yaml.safe_load(file)
 
@@ -50,8 +65,126 @@ new_branch = settings.get(
     "new_branch",
     f"bulk-update-{datetime.now().strftime('%Y%m%d')}"
 )
+max_workers = settings.get("max_workers", 16)
+branch_cache_file = settings.get("branch_cache_file", ".ado_cache.json")
+branch_cache_ttl = settings.get("branch_cache_ttl", 24 * 60 * 60)
 
 organization_url = f"{ado_base_url}/{organization_name}"
+pr_url_template = (
+    f"{ado_base_url.rstrip('/')}/{organization_name}"
+    "/{project}/_git/{repo}/pullrequest/{pr_id}"
+)
+
+# All strings are replaced in a single pass over the file content. Longer
+# strings come first, so they win over strings they contain.
+replacements = {string['old']: string['new'] for string in strings_to_replace}
+replacement_pattern = re.compile("|".join(
+    re.escape(old_string)
+    for old_string in sorted(replacements, key=len, reverse=True)
+))
+
+branch_cache = {}
+pr_cache = {}
+cache_lock = threading.Lock()
+
+
+def load_branch_cache():
+    """
+    Loads the branch tips remembered by previous runs, skipping entries
+    older than branch_cache_ttl seconds.
+
+    Returns:
+        dict: A mapping of cache keys to {"commit": str, "time": float}.
+    """
+    try:
+        with open(branch_cache_file, "r") as file:
+            entries = json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(entries, dict):
+        return {}
+
+    now = time.time()
+    fresh_entries = {}
+    for key, entry in entries.items():
+        # Anything not shaped like an entry written by save_branch_cache
+        # is treated as a cache miss.
+        try:
+            fresh = now - entry["time"] < branch_cache_ttl
+            valid = isinstance(entry["commit"], str)
+        except (KeyError, TypeError):
+            continue
+        if fresh and valid:
+            fresh_entries[key] = entry
+
+    return fresh_entries
+
+
+def save_branch_cache():
+    """
+    Stores the known branch tips, so the next run can skip looking them up.
+
+    Returns:
+        None
+    """
+    with cache_lock:
+        entries = dict(branch_cache)
+    with open(branch_cache_file, "w") as file:
+        json.dump(entries, file, indent=4)
+
+
+def get_branch_cache_key(project, repo_id, new_branch):
+    """
+    Builds the key of a branch in the branch cache.
+
+    Args:
+        project (str): The name or ID of the project.
+        repo_id (str): The ID of the repository.
+        new_branch (str): The name of the branch.
+
+    Returns:
+        str: The cache key.
+    """
+    return f"{organization_name}/{project}/{repo_id}/{new_branch}"
+
+
+def remember_branch(project, repo_id, new_branch, last_commit):
+    """
+    Records the last commit of a branch in the branch cache.
+
+    Args:
+        project (str): The name or ID of the project.
+        repo_id (str): The ID of the repository.
+        new_branch (str): The name of the branch.
+        last_commit (str): The ID of the last commit on the branch.
+
+    Returns:
+        None
+    """
+    with cache_lock:
+        branch_cache[get_branch_cache_key(project, repo_id, new_branch)] = {
+            "commit": last_commit,
+            "time": time.time(),
+        }
+
+
+def forget_branch(project, repo_id, new_branch):
+    """
+    Drops a branch from the branch cache, e.g. when the cached commit turned
+    out to be outdated.
+
+    Args:
+        project (str): The name or ID of the project.
+        repo_id (str): The ID of the repository.
+        new_branch (str): The name of the branch.
+
+    Returns:
+        None
+    """
+    with cache_lock:
+        branch_cache.pop(
+            get_branch_cache_key(project, repo_id, new_branch), None)
 
 
 def search_code(search_string, projects, repos):
@@ -66,9 +199,9 @@ def search_code(search_string, projects, repos):
         repos (list): A list of repository names to filter the search results.
             Default is None.
 
-    Returns:
-        CodeSearchResponse: The response object containing the code
-            search results.
+    Yields:
+        CodeResult: The matched files, fetched page by page until
+            all search results are returned.
     """
     filters = {}
 
@@ -81,92 +214,152 @@ def search_code(search_string, projects, repos):
         filters = None
 
     search_client = connection.clients.get_search_client()
-    search_request = CodeSearchRequest(
-        search_text=search_string,
-        top=1000,
-        filters=filters,
-        include_facets=False
+    page_size = 1000
+    skip = 0
+
+    while True:
+        search_request = CodeSearchRequest(
+            search_text=search_string,
+            skip=skip,
+            top=page_size,
+            filters=filters,
+            include_facets=False
+        )
+
+        try:
+            response = search_client.fetch_code_search_results(
+                request=search_request)
+        except AzureDevOpsServiceError:
+            logger.error(
+                "Code search failed | filters=%s | org=%s",
+                filters, organization_name, exc_info=True
+            )
+            sys.exit(1)
+
+        yield from response.results
+
+        if len(response.results) < page_size:
+            break
+        skip += page_size
+
+
+def get_pr_url(project, repo_name, pr_id):
+    """
+    Builds the web URL of a pull request.
+
+    Args:
+        project (str): The name of the project.
+        repo_name (str): The name of the repository.
+        pr_id (int): The ID of the pull request.
+
+    Returns:
+        str: The URL of the pull request.
+    """
+    return quote(
+        pr_url_template.format(project=project, repo=repo_name, pr_id=pr_id),
+        safe=":/"
     )
 
-    try:
-        response = search_client.fetch_code_search_results(
-            request=search_request)
-    except AzureDevOpsServiceError as e:
-        print(textwrap.dedent(f"""
-            An error occurred while fetching code search results
-            Filters: {filters}
-            Organization: {organization_name}
-            Error message: {e}
-        """))
-        sys.exit(1)
 
-    return response
+def get_search_texts(strings):
+    """
+    Combines the searched strings into as few code search queries as
+        possible. Strings are quoted and joined with OR; strings containing
+        a double quote cannot be quoted and get a query of their own.
+
+    Args:
+        strings (iterable): The strings to search for.
+
+    Returns:
+        list: The search texts to pass to search_code.
+    """
+    quotable = [string for string in strings if '"' not in string]
+    search_texts = [string for string in strings if '"' in string]
+    if quotable:
+        search_texts.insert(
+            0, " OR ".join(f'"{string}"' for string in quotable))
+
+    return search_texts
 
 
-def replace_string_in_file(
+def replace_strings_in_repo(
     project,
     repo_id,
     repo_name,
-    file_path,
-    old_string,
-    new_string,
-    new_branch
+    file_paths,
+    new_branch,
+    last_commit,
+    created
 ):
     """
-    Replaces a specific string in a file
-        and creates a pull request for the changes.
+    Replaces strings in files of a single repository with one push
+        and creates a pull request for the changes. Each file is read
+        once and all configured strings are replaced in a single pass.
 
     Args:
         project (str): The name or ID of the project.
         repo_id (str): The ID of the repository.
         repo_name (str): The name of the repository.
-        file_path (str): The path to the file in the repository.
-        old_string (str): The string to be replaced.
-        new_string (str): The new string to replace the old string.
+        file_paths (list): The paths of the files to update.
         new_branch (str): The name of the new branch to create for the changes.
+        last_commit (str): The known ID of the last commit on the branch.
+        created (bool): Whether the branch has just been created.
 
     Returns:
-        None
+        str: The URL of the pull request, or None if the branch does not
+            differ from the source branch.
     """
 
     git_client = connection.clients.get_git_client()
 
-    last_commit = create_or_get_branch(
+    existing_pr = get_active_pull_requests(
         project, repo_id, new_branch, git_client)
 
-    item = git_client.get_item(
-        project=project,
-        repository_id=repo_id,
-        path=file_path,
-        include_content=True,
-        version_descriptor=GitVersionDescriptor(
-            version_type="branch", version=new_branch
-        ),
-    )
-    existing_pr = git_client.get_pull_requests(
-        repository_id=repo_id,
-        project=project,
-        search_criteria=GitPullRequestSearchCriteria(
-            source_ref_name=f"refs/heads/{new_branch}",
-            target_ref_name=f"refs/heads/{source_branch}",
-            status="active",
-        )
-    )
-
+    pr_url = None
     if len(existing_pr) != 0:
-        pr_url = f"https://dev.azure.com/{organization_name}/{
-            project}/_git/{repo_name}/pullrequest/{existing_pr[0].pull_request_id}"
-
-    if old_string not in item.content:
-
+        pr_url = get_pr_url(
+            project, repo_name, existing_pr[0].pull_request_id)
+
+    # The files are read at the branch itself and the known tip commit is
+    # only used to guard the push. A tip remembered by a previous run may be
+    # outdated or the branch may be gone, so on a failed read or push the
+    # branch is looked up once more and the update retried.
+    for attempt in range(2):
+        try:
+            new_contents = get_new_contents(
+                project, repo_id, file_paths, git_client, new_branch)
+            if new_contents:
+                last_commit = update_files_content(
+                    project, repo_id, new_branch, git_client, last_commit,
+                    new_contents)
+                remember_branch(project, repo_id, new_branch, last_commit)
+            break
+        except AzureDevOpsServiceError as e:
+            if attempt or not is_branch_outdated(e):
+                raise
+            forget_branch(project, repo_id, new_branch)
+            last_commit, created = create_or_get_branch(
+                project, repo_id, new_branch, git_client)
+
+    if not new_contents:
         if existing_pr:
-            print(f"PR already exists: {pr_url}\n")
+            logger.info("PR already exists: %s", pr_url)
             return pr_url
-
-    new_content = item.content.replace(old_string, new_string)
-
-    update_file_content(project, repo_id, file_path,
-                        new_branch, git_client, last_commit, new_content)
+        # A branch just created from the source branch has nothing to merge.
+        if created:
+            return None
+        # The branch may already hold the changes from an earlier run whose
+        # pull request failed or was abandoned; it still needs a new one.
+        # Nothing was pushed, so the remembered tip is not verified yet.
+        last_commit = git_client.get_branch(
+            project=project, repository_id=repo_id, name=new_branch
+        ).commit.commit_id
+        remember_branch(project, repo_id, new_branch, last_commit)
+        source_commit = git_client.get_branch(
+            project=project, repository_id=repo_id, name=source_branch
+        ).commit.commit_id
+        if last_commit == source_commit:
+            return None
 
     if not existing_pr:
         pr = git_client.create_pull_request(
@@ -178,37 +371,105 @@ def replace_string_in_file(
             repository_id=repo_id,
             project=project,
         )
-        pr_url = f"https://dev.azure.com/{organization_name}/{
-            project}/_git/{repo_name}/pullrequest/{pr.pull_request_id}"
-        print(f"PR created: {pr_url}\n")
+        pr_url = get_pr_url(project, repo_name, pr.pull_request_id)
+        logger.info("PR created: %s", pr_url)
     else:
-        print(f"PR already exists: {pr_url}\n")
+        logger.info("PR already exists: %s", pr_url)
 
     return pr_url
 
 
-def update_file_content(project, repo_id, file_path, new_branch,
-                        git_client, last_commit, new_content):
+def get_new_contents(project, repo_id, file_paths, git_client, new_branch):
     """
-    Updates the content of a file in a Git repository.
+    Reads files at the tip of the given branch and replaces the configured
+    strings in them.
+
+    Args:
+        project (str): The name or ID of the project.
+        repo_id (str): The ID of the repository.
+        file_paths (list): The paths of the files to read.
+        git_client (GitClient): The Git client object.
+        new_branch (str): The name of the branch to read the files at.
+
+    Returns:
+        dict: A mapping of file paths to their new content, containing only
+            the files which actually changed.
+    """
+    new_contents = {}
+    for file_path in file_paths:
+        # The raw file bytes are fetched instead of the item metadata JSON,
+        # which would carry the content as an escaped string to be parsed.
+        chunks = git_client.get_item_content(
+            project=project,
+            repository_id=repo_id,
+            path=file_path,
+            version_descriptor=GitVersionDescriptor(
+                version_type="branch", version=new_branch
+            ),
+        )
+        try:
+            content = b"".join(chunks).decode("utf-8")
+        except UnicodeDecodeError:
+            logger.warning(
+                "Skipping '%s', it is not a UTF-8 text file", file_path)
+            continue
+        new_content = replacement_pattern.sub(
+            lambda match: replacements[match.group(0)], content)
+        if new_content != content:
+            new_contents[file_path] = new_content
+
+    return new_contents
+
+
+def to_item_content(content):
+    """
+    Wraps new file content for a push, picking the smaller wire encoding.
+    As rawtext the content is sent as a JSON string, where quotes, control
+    characters and every non-ASCII character are escaped; base64 costs a
+    fixed third on top of the UTF-8 bytes. Both sizes are compared and the
+    smaller one is sent.
+
+    Args:
+        content (str): The new content of the file.
+
+    Returns:
+        ItemContent: The content to attach to the change.
+    """
+    raw = content.encode("utf-8")
+    if len(json.dumps(content)) <= (len(raw) + 2) // 3 * 4:
+        return ItemContent(content=content, content_type="rawtext")
+
+    return ItemContent(
+        content=base64.b64encode(raw).decode("ascii"),
+        content_type="base64encoded",
+    )
+
+
+def update_files_content(project, repo_id, new_branch,
+                         git_client, last_commit, new_contents):
+    """
+    Updates the content of files in a Git repository with a single push.
 
     Args:
         project (str): The name or ID of the project.
         repo_id (str): The ID of the repository.
-        file_path (str): The path of the file to be updated.
         new_branch (str): The name of the new branch to be created.
         git_client (GitClient): The Git client used to perform the update.
         last_commit (str): The ID of the last commit on the branch.
-        new_content (str): The new content to be written to the file.
+        new_contents (dict): A mapping of file paths to the new content
+            to be written to them.
 
     Returns:
-        None
+        str: The commit ID the branch points to after the push.
     """
-    change = Change(
-        change_type="edit",
-        item=GitItem(path=file_path),
-        new_content=ItemContent(content=new_content, content_type="rawtext"),
-    )
+    changes = [
+        Change(
+            change_type="edit",
+            item=GitItem(path=file_path),
+            new_content=to_item_content(new_content),
+        )
+        for file_path, new_content in new_contents.items()
+    ]
 
     push = GitPush(
         ref_updates=[
@@ -217,10 +478,83 @@ def update_file_content(project, repo_id, file_path, new_branch,
                 old_object_id=last_commit)
         ],
         commits=[GitCommitRef(
-            comment="Updated file content", changes=[change])],
+            comment="Updated file content", changes=changes)],
     )
 
-    git_client.create_push(push=push, project=project, repository_id=repo_id)
+    push = git_client.create_push(
+        push=push, project=project, repository_id=repo_id)
+
+    return push.ref_updates[0].new_object_id
+
+
+def get_active_pull_requests(project, repo_id, new_branch, git_client):
+    """
+    Retrieves the active pull requests from the new branch to the source
+    branch. The result is cached per repository and branch for the whole run.
+
+    Args:
+        project (str): The name or ID of the project.
+        repo_id (str): The ID of the repository.
+        new_branch (str): The name of the branch the changes are pushed to.
+        git_client (GitClient): The Git client object.
+
+    Returns:
+        list: The active pull requests, empty if there are none.
+    """
+    with cache_lock:
+        pull_requests = pr_cache.get((repo_id, new_branch))
+    if pull_requests is not None:
+        return pull_requests
+
+    pull_requests = git_client.get_pull_requests(
+        repository_id=repo_id,
+        project=project,
+        search_criteria=GitPullRequestSearchCriteria(
+            source_ref_name=f"refs/heads/{new_branch}",
+            target_ref_name=f"refs/heads/{source_branch}",
+            status="active",
+        )
+    )
+    with cache_lock:
+        pr_cache[(repo_id, new_branch)] = pull_requests
+
+    return pull_requests
+
+
+def is_branch_not_found(error):
+    """
+    Tells whether a service error means that the requested branch does not
+    exist, as opposed to e.g. missing permissions or a server failure.
+
+    Args:
+        error (AzureDevOpsServiceError): The error raised by get_branch.
+
+    Returns:
+        bool: True if the branch does not exist.
+    """
+    return (
+        error.type_key == "GitUnresolvableToCommitException"
+        or (error.message or "").startswith("TF401175")
+    )
+
+
+def is_branch_outdated(error):
+    """
+    Tells whether a service error means that the known tip of a branch is
+    outdated: the branch has been deleted or has moved since it was cached.
+
+    Args:
+        error (AzureDevOpsServiceError): The error raised when reading files
+            at the branch or pushing to it.
+
+    Returns:
+        bool: True if looking the branch up again may fix the error.
+    """
+    return (
+        is_branch_not_found(error)
+        or error.type_key == "GitReferenceStaleException"
+        or (error.message or "").startswith("TF401028")
+    )
 
 
 def create_or_get_branch(project, repo_id, new_branch, git_client):
@@ -235,17 +569,24 @@ def create_or_get_branch(project, repo_id, new_branch, git_client):
         git_client (GitClient): The Git client object.
 
     Returns:
-        str: The commit ID of the last commit on the branch.
-    """
-    branches = git_client.get_branches(project=project, repository_id=repo_id)
-    branch_exists = False
-    for branch in branches:
-        if branch.name == new_branch:
-            branch_exists = True
-            last_commit = branch.commit.commit_id
-            break
+        tuple: The commit ID of the last commit on the branch and a boolean
+            indicating whether the branch has just been created.
+    """
+    with cache_lock:
+        entry = branch_cache.get(
+            get_branch_cache_key(project, repo_id, new_branch))
+    if entry is not None:
+        return entry["commit"], False
 
-    if not branch_exists:
+    try:
+        last_commit = git_client.get_branch(
+            project=project, repository_id=repo_id, name=new_branch
+        ).commit.commit_id
+        created = False
+    except AzureDevOpsServiceError as e:
+        if not is_branch_not_found(e):
+            raise
+        # The branch does not exist yet, create it from the source branch.
         last_commit = git_client.get_branch(
             project=project, repository_id=repo_id, name=source_branch
         ).commit.commit_id
@@ -255,61 +596,195 @@ def create_or_get_branch(project, repo_id, new_branch, git_client):
             old_object_id="0" * 40,
             new_object_id=last_commit,
         )
-        git_client.update_refs(
-            ref_updates=[create_branch], repository_id=repo_id, project=project
+        results = git_client.update_refs(
+            ref_updates=[create_branch],
+            repository_id=repo_id,
+            project=project
+        )
+        if not all(result.success for result in results):
+            raise RuntimeError(
+                f"Could not create branch '{new_branch}' in repository "
+                f"'{repo_id}': {results[0].update_status}"
+            )
+        created = True
+        # A branch created a moment ago cannot have a pull request yet.
+        with cache_lock:
+            pr_cache[(repo_id, new_branch)] = []
+
+    remember_branch(project, repo_id, new_branch, last_commit)
+
+    return last_commit, created
+
+
+class RefreshingTokenAuthentication(BasicTokenAuthentication):
+    """
+    Bearer token authentication which renews the Azure AD token shortly
+    before it expires and mounts one pooled, keep-alive HTTP adapter on every
+    session used by the Azure DevOps clients, so TCP and TLS connections are
+    reused across all REST calls and worker threads.
+    """
+
+    def __init__(self, credential, scope):
+        self.credential = credential
+        self.scope = scope
+        self.token_lock = threading.Lock()
+        self.access_token = credential.get_token(scope)
+        super().__init__({"access_token": self.access_token.token})
+        # One connection per worker thread plus the main thread is kept
+        # alive for each host, so no thread ever has to open a throwaway
+        # connection when the pool is exhausted.
+        # The adapter replaces the default one and with it the retry policy
+        # msrest sets on it, which also retries POST and PATCH. Those are
+        # kept here, as code search is a POST; pushes are guarded by the old
+        # commit ID, so a retried push cannot be applied twice.
+        self.adapter = HTTPAdapter(
+            pool_connections=32,
+            pool_maxsize=max_workers + 1,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.8,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {
+                    "POST", "PATCH"},
+            ),
         )
 
-    return last_commit
+    def signed_session(self, session=None):
+        with self.token_lock:
+            if self.access_token.expires_on - 300 < time.time():
+                self.access_token = self.credential.get_token(self.scope)
+                self.token = {"access_token": self.access_token.token}
+        session = super().signed_session(session)
+        if session.adapters.get("https://") is not self.adapter:
+            session.mount("https://", self.adapter)
+        return session
 
 
 credential = DefaultAzureCredential()
-token = credential.get_token("499b84ac-1321-427f-aa17-267ca6975798/.default")
-credentials = BasicTokenAuthentication({"access_token": token.token})
+credentials = RefreshingTokenAuthentication(
+    credential, "499b84ac-1321-427f-aa17-267ca6975798/.default")
 
 connection = Connection(base_url=organization_url, creds=credentials)
 
-pr_summary = []
+branch_cache.update(load_branch_cache())
 
-for project, repos in projects_and_repos.items():
-    for string in strings_to_replace:
-        print(f"Searching for '{string['old']}'...\n")
-        if project is None:
-            response = search_code(string['old'], project, repos)
-        else:
-            response = search_code(string['old'], [project], repos)
-        response_json = json.dumps(response.as_dict(), indent=4)
-
-        if response.count == 0:
-            if project is None:
-                project = "all"
-            if repos is None:
-                repos = ["all"]
-            print(
-                f"No results found for the search string '{string['old']}' in "
-                f"projects {project} and "
-                f"repositories {', '.join(repos)}\n"
-            )
-            continue
+pr_summary = []
 
-        for result in response.results:
-            print(
-                f"Found '{string['old']}' in project '{result.project.name}' "
-                f"and repository '{result.repository.name}' at '{result.path}'"
-            )
-            if not dry_run:
-                print(f"Replacing '{string['old']}' with '{string['new']}'")
-                pr_info = replace_string_in_file(
-                    result.project.name,
-                    result.repository.id,
-                    result.repository.name,
-                    result.path,
-                    string['old'],
-                    string['new'],
-                    new_branch
+try:
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        searches = []
+        for project, repos in projects_and_repos.items():
+            for search_text in get_search_texts(replacements):
+                logger.info("Searching for %s...", search_text)
+                searches.append((project, repos, search_text, executor.submit(
+                    list,
+                    search_code(
+                        search_text,
+                        None if project is None else [project],
+                        repos
+                    )
+                )))
+
+        hits = set()
+        repo_names = {}
+        for project, repos, search_text, search in searches:
+            results = search.result()
+
+            if not results:
+                if project is None:
+                    project = "all"
+                if repos is None:
+                    repos = ["all"]
+                logger.info(
+                    "No results found for %s in projects %s and "
+                    "repositories %s",
+                    search_text, project, ", ".join(repos)
+                )
+                continue
+
+            for result in results:
+                if not (result.matches or {}).get('content'):
+                    # Only the file name matched, there is nothing to replace.
+                    continue
+                logger.info(
+                    "Found a match in project '%s' and repository '%s' "
+                    "at '%s'",
+                    result.project.name, result.repository.name, result.path
                 )
-                pr_summary.append(pr_info)
-if dry_run:
-    print("Dry run. No changes made.")
-else:
-    pr_summary = list(set(pr_summary))
-    print("PRs summary:\n" + "\n".join(pr_summary))
+                hits.add(
+                    (result.project.name, result.repository.id, result.path))
+                repo_names[result.repository.id] = result.repository.name
+
+        repos_to_update = {
+            repo: [file_path for _, _, file_path in repo_hits]
+            for repo, repo_hits in groupby(
+                sorted(hits), key=lambda hit: hit[:2])
+        }
+
+        futures = {}
+        if not dry_run:
+            # Look up or create the working branches of all repositories at
+            # once and hand the tips to the workers. A branch tip remembered
+            # by a previous run is taken as is and only checked when pushing.
+            git_client = connection.clients.get_git_client()
+            branch_futures = {
+                executor.submit(
+                    create_or_get_branch,
+                    project,
+                    repo_id,
+                    new_branch,
+                    git_client
+                ): repo_id
+                for project, repo_id in repos_to_update
+            }
+            branches = {}
+            for future in as_completed(branch_futures):
+                try:
+                    last_commit, created = future.result()
+                except Exception:
+                    logger.exception(
+                        "Could not get branch '%s' in repository '%s'",
+                        new_branch, repo_names[branch_futures[future]]
+                    )
+                    continue
+                branches[branch_futures[future]] = last_commit, created
+                if created:
+                    logger.info(
+                        "Created branch '%s' in repository '%s'",
+                        new_branch, repo_names[branch_futures[future]]
+                    )
+
+            for (project, repo_id), file_paths in repos_to_update.items():
+                if repo_id not in branches:
+                    continue
+                logger.info(
+                    "Replacing strings in %d file(s) of repository '%s'",
+                    len(file_paths), repo_names[repo_id]
+                )
+                futures[executor.submit(
+                    replace_strings_in_repo,
+                    project,
+                    repo_id,
+                    repo_names[repo_id],
+                    file_paths,
+                    new_branch,
+                    *branches[repo_id]
+                )] = repo_id
+
+        # A failing repository is logged and skipped, the others still get
+        # their pull requests and the summary below.
+        for future in as_completed(futures):
+            try:
+                pr_summary.append(future.result())
+            except Exception:
+                logger.exception(
+                    "Updating repository '%s' failed",
+                    repo_names[futures[future]]
+                )
+finally:
+    if dry_run:
+        logger.info("Dry run. No changes made.")
+    else:
+        save_branch_cache()
+        pr_summary = list(set(filter(None, pr_summary)))
+        logger.info("PRs summary:\n%s", "\n".join(pr_summary))